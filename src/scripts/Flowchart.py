@@ -1,5 +1,9 @@
+import os
 import plotly.graph_objects as go
 
+# Output path (without extension) for the rendered diagram
+out_path = "./data/results/sankey_flag_ownership"
+
 # Define nodes
 nodes = [
     "Scraped Vessels",       # 0
@@ -77,4 +81,9 @@ fig.update_layout(
     width=1200
 )
 
-fig.show()
+if __name__ == "__main__":
+    # Write static artifacts instead of opening a browser window
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    fig.write_image(out_path + ".png", engine="kaleido", width=1200, height=800)
+    fig.write_html(out_path + ".html", include_plotlyjs="cdn")
+    print(f"Sankey diagram saved to {out_path}.png and {out_path}.html")
@@ -0,0 +1,135 @@
+"""Offline checks for extract.py, run against a local fake GFW API.
+
+Usage: python src/scripts/check_extract.py
+
+Covers checkpoint resume (identifier keying, fresh and resumed output identical),
+cache hits bypassing the rate limiter, and the API token staying out of the caches.
+Everything runs in a temporary directory; nothing touches ./data.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Must be set before extract builds its request headers
+FAKE_TOKEN = "CHECK_EXTRACT_SECRET_TOKEN"
+os.environ["GFW_API_TOKEN"] = FAKE_TOKEN
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import aiohttp
+import pandas as pd
+from yarl import URL
+import extract
+
+class FakeGFWHandler(BaseHTTPRequestHandler):
+    """Answers /vessels/search?query=imo:N with a registry record derived from N."""
+
+    calls = []
+
+    def do_GET(self):
+        FakeGFWHandler.calls.append(self.path)
+        query = parse_qs(urlparse(self.path).query).get('query', [''])[0]
+        entries = []
+        if query.startswith('imo:'):
+            number = int(query[len('imo:'):])
+            registry = {'lengthM': 100 + number, 'tonnageGt': 2000 + number}
+            # Leave one vessel without a build year so integer columns have gaps
+            if number != 3:
+                registry['yearBuilt'] = 1990 + number
+            entries.append({'registryInfo': [registry]})
+
+        body = json.dumps({'entries': entries}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_api():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGFWHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def vessel_frame(imos):
+    return pd.DataFrame({
+        'Vessel_ID': [''] * len(imos),
+        'IMO': imos,
+        'SSVID': [''] * len(imos),
+        'Callsign': [''] * len(imos),
+        'Vessel Name': [f"VESSEL {imo}" for imo in imos]
+    })
+
+def check_resume():
+    """An interrupted run resumed on re-sorted input must match a fresh run exactly."""
+    imos = ['1', '2', '3']
+    fresh = extract.enrich_vessel_data(vessel_frame(imos), use_cache=False)
+
+    # Interrupted run: only the first two vessels made it into the checkpoint
+    checkpoint_dir = "checkpoint"
+    extract.enrich_vessel_data(vessel_frame(imos[:2]), use_cache=False, checkpoint_path=checkpoint_dir)
+
+    # Resume on the same vessels in reverse order; results must follow the identifiers
+    calls_before = len(FakeGFWHandler.calls)
+    resumed = extract.enrich_vessel_data(vessel_frame(imos[::-1]), use_cache=False, checkpoint_path=checkpoint_dir)
+    assert len(FakeGFWHandler.calls) - calls_before == 1, "only the unfinished vessel should be looked up"
+    resumed = resumed.iloc[::-1].reset_index(drop=True)
+
+    extract.save_enriched_data(fresh, "fresh.csv")
+    extract.save_enriched_data(resumed, "resumed.csv")
+    with open("fresh.csv") as f_fresh, open("resumed.csv") as f_resumed:
+        fresh_csv, resumed_csv = f_fresh.read(), f_resumed.read()
+    assert fresh_csv == resumed_csv, f"fresh and resumed output differ:\n{fresh_csv}\n{resumed_csv}"
+
+    # Integer API values stay integers even where another vessel lacks them
+    row = fresh.set_index('IMO').loc['1']
+    assert (str(row['Length']), str(row['YearBuilt'])) == ('101', '1991'), row
+    assert fresh.set_index('IMO').loc['3', 'YearBuilt'] == ''
+    print("resume: OK")
+
+async def _cached_lookups(count):
+    connector = aiohttp.TCPConnector()
+    timeout = aiohttp.ClientTimeout(total=5)
+    async with extract._open_async_session(connector, timeout) as session:
+        # One request per minute: any lookup that waits on the limiter would stall
+        limiter = extract.AdaptiveLimiter(rpm_limit=1)
+        url = URL(extract.build_search_url('IMO', '7'), encoded=True)
+        for _ in range(count):
+            status, _payload = await asyncio.wait_for(extract._limited_get(session, limiter, url), 5)
+            assert status == 200
+        return len(limiter._window)
+
+def check_cache_bypasses_limiter():
+    """Repeated lookups served from the cache must not use the limiter's RPM window."""
+    calls_before = len(FakeGFWHandler.calls)
+    started = time.monotonic()
+    window = asyncio.run(_cached_lookups(5))
+    assert window == 1, f"cache hits entered the RPM window ({window} entries)"
+    assert len(FakeGFWHandler.calls) - calls_before == 1, "cache hits reached the API"
+    assert time.monotonic() - started < 5
+    print("cache bypasses limiter: OK")
+
+def check_token_not_cached():
+    """Neither response cache may contain the API token."""
+    for name in os.listdir(extract.CACHE_DIR):
+        with open(os.path.join(extract.CACHE_DIR, name), 'rb') as f:
+            assert FAKE_TOKEN.encode() not in f.read(), f"API token written to {name}"
+    print("token not cached: OK")
+
+def main():
+    extract.BASE_URL = start_fake_api()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        check_resume()
+        check_cache_bypasses_limiter()
+        check_token_not_cached()
+    print("All checks passed")
+
+if __name__ == "__main__":
+    main()
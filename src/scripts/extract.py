@@ -1,16 +1,30 @@
 import os
+import re
+import glob
+import shutil
+import time
+import argparse
+import contextlib
+from collections import deque
 import pandas as pd
-import requests
-import concurrent.futures
+import pyarrow as pa
+import pyarrow.parquet as pq
+from requests_cache import CachedSession
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+import asyncio
+import aiohttp
+from yarl import URL
+from urllib.parse import quote, urlencode
+import orjson
+from aiohttp_client_cache import CachedSession as AsyncCachedSession, CachedResponse, SQLiteBackend
 from dotenv import load_dotenv
-from tqdm import tqdm  # For progress bar
-import json  # For pretty printing API responses
+from tqdm.asyncio import tqdm as tqdm_asyncio  # For progress bar
+import logging
 
-def debug_log(message, data=None):
-    """Print debug information."""
-    print(f"DEBUG: {message}")
-    if data and isinstance(data, dict):
-        print(json.dumps(data, indent=2)[:500])  # Limit output length
+# Debug output is formatted lazily, so it costs nothing unless --debug is passed
+logger = logging.getLogger("gfw")
+logger.setLevel(logging.INFO)
 
 # Load environment variables
 load_dotenv()
@@ -23,93 +37,361 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
+# On-disk response cache so repeated runs don't re-fetch the same vessels
+CACHE_DIR = "./data/cache"
+CACHE_EXPIRE_SECONDS = 7 * 86400
+
+# Dataset selector shared by every search and batch request, encoded once at load
+_BASE_QS = urlencode({"datasets[0]": "public-global-vessel-identity:latest"})
+
+# Shared session so every API call reuses pooled keep-alive connections; see get_session()
+_SESSION = None
+
+def get_session():
+    """Return the shared cached requests session, creating it (and the cache dir) on first use."""
+    global _SESSION
+    if _SESSION is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        session = CachedSession(
+            os.path.join(CACHE_DIR, "gfw_cache.sqlite"),
+            backend="sqlite",
+            expire_after=CACHE_EXPIRE_SECONDS,
+            allowable_codes=(200,)
+        )
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504], allowed_methods=["GET"])
+        )
+        session.mount("https://", adapter)
+        session.headers.update(HEADERS)
+        _SESSION = session
+    return _SESSION
+
+# Concurrency limits for the async enrichment run
+MAX_CONNECTIONS = 64
+MAX_CONNECTIONS_PER_HOST = 32
+KEEPALIVE_SECONDS = 75  # Outlive Retry-After pauses so connections aren't re-handshaked
+DNS_CACHE_SECONDS = 300
+INITIAL_CONCURRENCY = 8
+MAX_CONCURRENCY = 64
+LATENCY_TARGET_SECONDS = 2.0
+MAX_THROTTLE_RETRIES = 5
+MAX_REQUESTS_PER_MINUTE = 600  # Sliding-window cap; lowered to x-ratelimit-limit when the API sends one
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter for the GFW API.
+    
+    Concurrency grows additively while responses are fast and successful, and is
+    halved on 429/5xx. After a 429 all requests wait out Retry-After, then a single
+    request probes the API before the rest are let through again.
+    """
+    
+    def __init__(self, initial=INITIAL_CONCURRENCY, max_concurrency=MAX_CONCURRENCY,
+                 latency_target=LATENCY_TARGET_SECONDS, rpm_limit=MAX_REQUESTS_PER_MINUTE,
+                 increase=0.5, decrease=0.5):
+        self.current_concurrency = float(initial)
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.latency_ema = None
+        self.rpm_limit = rpm_limit
+        self.increase = increase
+        self.decrease = decrease
+        self._window = deque()  # Request start times within the last minute
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._throttled = False
+        self._throttled_at = 0.0  # When the current throttle pause began
+        self._cond = asyncio.Condition()
+    
+    def _limit(self):
+        # While recovering from a 429 only one request may probe the API
+        if self._throttled:
+            return 1
+        return max(1, int(self.current_concurrency))
+    
+    def _wait_time(self, now):
+        """Seconds until a slot may open, 0 if one is free now, None to wait for a release."""
+        while self._window and now - self._window[0] > 60:
+            self._window.popleft()
+        if self._paused_until > now:
+            return self._paused_until - now
+        if self.rpm_limit and len(self._window) >= self.rpm_limit:
+            return 60 - (now - self._window[0])
+        if self._in_flight < self._limit():
+            return 0
+        return None
+    
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(now)
+                if wait == 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._cond.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._in_flight += 1
+            self._window.append(now)
+    
+    async def release(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+    
+    async def observe(self, status, started, latency, retry_after=None, remaining=None, limit=None):
+        """Adjust concurrency from one response's status, latency and rate-limit headers.
+        
+        started is the monotonic time the request was sent; responses to requests sent
+        before a 429 can't end the single-probe phase that follows it.
+        """
+        async with self._cond:
+            if limit:
+                self.rpm_limit = min(self.rpm_limit, limit) if self.rpm_limit else limit
+            
+            if self.latency_ema is None:
+                self.latency_ema = latency
+            else:
+                self.latency_ema = 0.8 * self.latency_ema + 0.2 * latency
+            
+            if status == 429:
+                self._throttled = True
+                self._throttled_at = time.monotonic()
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self.current_concurrency = max(1.0, self.current_concurrency * self.decrease)
+            elif status >= 500:
+                self.current_concurrency = max(1.0, self.current_concurrency * self.decrease)
+            else:
+                if self._throttled and started >= self._throttled_at:
+                    self._throttled = False
+                # Don't grow when the API reports the quota is used up
+                if self.latency_ema < self.latency_target and remaining != 0:
+                    self.current_concurrency = min(self.max_concurrency, self.current_concurrency + self.increase)
+            self._cond.notify_all()
+
+def _parse_retry_after(value, attempt):
+    """Seconds to wait from a Retry-After header, with exponential backoff as fallback."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return min(2 ** attempt, 30)
+
+async def _is_cached(session, url, params=None):
+    """True if the session would answer this GET from its on-disk cache."""
+    cache = getattr(session, "cache", None)
+    if cache is None or cache.disabled:
+        return False
+    return await cache.get_response(cache.create_key("GET", url, params=params)) is not None
+
+async def _limited_get(session, limiter, url, params=None):
+    """GET through the adaptive limiter, retrying 429s. Returns (status, json or text).
+    
+    Responses already in the on-disk cache don't touch the API, so they skip the
+    limiter entirely and a warm run isn't held to the live request rate.
+    """
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        cached = await _is_cached(session, url, params)
+        if not cached:
+            await limiter.acquire()
+        try:
+            started = time.monotonic()
+            async with session.get(url, params=params) as response:
+                if response.status == 200:
+                    payload = orjson.loads(await response.read())
+                else:
+                    payload = await response.text()
+                status = response.status
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"), attempt)
+                remaining = response.headers.get("x-ratelimit-remaining")
+                limit = response.headers.get("x-ratelimit-limit")
+                from_cache = getattr(response, "from_cache", False)
+        finally:
+            if not cached:
+                await limiter.release()
+        
+        # Cached responses say nothing about the API's current load
+        if not from_cache:
+            await limiter.observe(
+                status,
+                started,
+                time.monotonic() - started,
+                retry_after=retry_after,
+                remaining=int(remaining) if remaining and remaining.isdigit() else None,
+                limit=int(limit) if limit and limit.isdigit() else None
+            )
+        if status != 429:
+            return status, payload
+    
+    return status, payload
+
+# Input columns used to look a vessel up
+IDENTIFIER_COLUMNS = ['Vessel_ID', 'IMO', 'SSVID', 'Callsign', 'Vessel Name']
+
+# Columns filled with the new information ('' where the API had nothing)
+ENRICHED_COLUMNS = [
+    'Length', 'Width', 'GrossTonnage', 'VesselType', 'EngineType', 'EnginePower',
+    'YearBuilt', 'AuthType', 'AuthRegion', 'AuthStartDate', 'AuthEndDate',
+    'Owner', 'Operator',
+    'BuildPlace', 'BuildCountry', 'HomePort', 'FlagHistory',
+    'AuthRegions', 'AuthTypes', 'NeuralClassification', 'DetailedOwnership'
+]
+
+# Enriched columns with few distinct values, stored dictionary-encoded in Parquet
+CATEGORICAL_COLUMNS = ['VesselType', 'BuildCountry', 'HomePort', 'NeuralClassification', 'AuthType', 'AuthTypes']
+
+# Finished vessels are written to the checkpoint in row groups of this size
+CHECKPOINT_BATCH_ROWS = 500
+
+# GFW vessel IDs are hex/UUID-like strings; anything else can only 404
+_GFW_ID_RE = re.compile(r'^[0-9a-fA-F-]{30,40}$')
+
+class ResultCheckpoint:
+    """Directory of Parquet parts logging finished vessels so an interrupted run can resume.
+    
+    Rows are keyed by their identifier tuple (IDENTIFIER_COLUMNS), so a resume stays
+    correct if the input is edited or re-sorted in between. Every CHECKPOINT_BATCH_ROWS
+    rows are written as a complete part-N.parquet file and renamed into place, so a
+    hard kill loses at most the rows still buffered. Callers should only log vessels
+    whose lookups all got a definite answer, so temporary failures are retried on resume.
+    """
+    
+    def __init__(self, path, columns=ENRICHED_COLUMNS, batch_rows=CHECKPOINT_BATCH_ROWS):
+        self.path = path
+        self.columns = columns
+        self.batch_rows = batch_rows
+        self.schema = pa.schema([(col, pa.string()) for col in IDENTIFIER_COLUMNS + columns])
+        self._buffer = []
+        self._next_part = 0
+    
+    def open(self):
+        """Start logging, returning {identifier tuple: vessel info} finished by earlier runs."""
+        os.makedirs(self.path, exist_ok=True)
+        parts = sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+        
+        done = {}
+        for part in parts:
+            table = pq.read_table(part).select(self.schema.names).cast(self.schema)
+            for record in table.to_pylist():
+                identifiers = tuple(record.pop(col) for col in IDENTIFIER_COLUMNS)
+                done[identifiers] = {col: value for col, value in record.items() if value is not None}
+            number = int(os.path.basename(part)[len('part-'):-len('.parquet')])
+            self._next_part = max(self._next_part, number + 1)
+        return done
+    
+    def add(self, identifiers, vessel_info):
+        row = dict(zip(IDENTIFIER_COLUMNS, identifiers))
+        for col in self.columns:
+            value = vessel_info.get(col)
+            row[col] = None if value is None else str(value)
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_rows:
+            self.flush()
+    
+    def flush(self):
+        if not self._buffer:
+            return
+        part_path = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        tmp_path = part_path + '.tmp'
+        table = pa.Table.from_pylist(self._buffer, schema=self.schema)
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, part_path)  # A part is either complete or absent
+        self._next_part += 1
+        self._buffer = []
+    
+    def close(self):
+        self.flush()
+
 def read_vessel_data(file_path):
-    """Read vessel data from CSV file."""
-    df = pd.read_csv(file_path)
-    # Convert any NaN values to empty string for API queries
-    df = df.fillna('')
+    """Read vessel data, preferring a Parquet copy next to the CSV file if it is newer."""
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    # A stale Parquet copy must not hide a CSV that was updated after it
+    if os.path.exists(parquet_path) and (
+        not os.path.exists(file_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(file_path)
+    ):
+        df = pd.read_parquet(parquet_path, dtype_backend='pyarrow')
+    else:
+        df = pd.read_csv(file_path, engine='pyarrow', dtype_backend='pyarrow')
+    # Convert missing text values to empty string for API queries; numeric columns keep NA
+    string_columns = [col for col, dtype in df.dtypes.items() if pd.api.types.is_string_dtype(dtype)]
+    df[string_columns] = df[string_columns].fillna('')
+    
+    # Normalize identifiers once so lookups can test them directly
+    for col in IDENTIFIER_COLUMNS:
+        df[col] = df[col].astype('string').str.strip().fillna('')
     return df
 
-def search_vessel_by_identifier(identifier_type, identifier_value):
-    """Search for a vessel using various identifiers (IMO, MMSI, Callsign)."""
+def build_search_url(identifier_type, identifier_value):
+    """Build the full /vessels/search URL for an identifier, or None if unusable."""
     if not identifier_value or str(identifier_value).strip() == '':
         return None
     
     # Clean up identifier value - remove any problematic characters
     identifier_value = str(identifier_value).strip().replace("'", "").replace('"', '')
     
-    url = f"{BASE_URL}/vessels/search"
-    
-    # Set up base params
-    params = {
-        "datasets[0]": "public-global-vessel-identity:latest"
-    }
-    
     # Use the appropriate field based on identifier type
     if identifier_type == 'IMO':
-        params["query"] = f"imo:{identifier_value}"
+        query = f"imo:{identifier_value}"
     elif identifier_type == 'SSVID':
         if isinstance(identifier_value, float):
-            params["query"] = f"ssvid:{int(identifier_value)}"
+            query = f"ssvid:{int(identifier_value)}"
         else:
             try:
-                params["query"] = f"ssvid:{int(float(identifier_value))}"
+                query = f"ssvid:{int(float(identifier_value))}"
             except ValueError:
-                params["query"] = f"ssvid:{identifier_value}"
+                query = f"ssvid:{identifier_value}"
     elif identifier_type == 'Callsign':
-        params["query"] = f"callsign:{identifier_value}"
+        query = f"callsign:{identifier_value}"
     elif identifier_type == 'VesselName':
-        params["query"] = f"shipname:{identifier_value}"
+        query = f"shipname:{identifier_value}"
     else:
         return None
     
-    try:
-        # Add debug logging for better troubleshooting
-        debug_log(f"Searching with params: {params}")
-        response = requests.get(url, headers=HEADERS, params=params)
-        
-        if response.status_code == 200:
-            data = response.json()
-            entry_count = len(data.get('entries', []))
-            
-            if entry_count > 0:
-                return data
-            else:
-                return None
-        else:
-            debug_log(f"Search failed with status {response.status_code}: {response.text}")
-            return None
-    except Exception as e:
-        print(f"Exception when searching vessel by {identifier_type}: {e}")
-        return None
+    # Only the query varies per call, so encode it onto the static dataset string
+    return f"{BASE_URL}/vessels/search?{_BASE_QS}&query={quote(query, safe=':')}"
 
-def get_vessel_by_id(vessel_id):
-    """Get detailed information for a vessel by its ID."""
-    if not vessel_id or vessel_id == '':
-        return None
+async def search_vessel_async(session, limiter, searches, identifier_type, identifier_value):
+    """Search for a vessel by one identifier (IMO, SSVID, Callsign, VesselName) over the shared aiohttp session.
     
-    vessel_id = vessel_id.strip()
-    url = f"{BASE_URL}/vessels/{vessel_id}"
+    searches maps URL -> task for the current run, so rows sharing an identifier await
+    the same search instead of repeating the request.
     
-    # Remove all parameters except dataset
-    params = {
-        "dataset": "public-global-vessel-identity:latest"
-    }
+    Returns (vessel info or None if no match, definite), where definite is False when the
+    API gave no clear answer (throttled, 5xx, timeout...) and the lookup is worth retrying later.
+    """
+    url = build_search_url(identifier_type, identifier_value)
+    if url is None:
+        return None, True
+    
+    task = searches.get(url)
+    if task is None:
+        task = asyncio.ensure_future(_search_vessel_async(session, limiter, identifier_type, url))
+        searches[url] = task
+    # Shield so one cancelled caller doesn't cancel the search for the others
+    return await asyncio.shield(task)
+
+async def _search_vessel_async(session, limiter, identifier_type, url):
+    """Issue one /vessels/search request; results are shared via search_vessel_async.
     
+    Only the extracted vessel info is kept, not the raw payload, so finished searches
+    stay small for the rest of the run.
+    """
     try:
-        debug_log(f"Requesting vessel ID: {vessel_id}")
-        response = requests.get(url, headers=HEADERS, params=params)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            debug_log(f"Vessel ID lookup failed: {response.status_code}: {response.text}")
-            return None
+        logger.debug("Searching with URL: %s", url)
+        # The URL is already encoded; stop aiohttp from re-quoting it
+        status, data = await _limited_get(session, limiter, URL(url, encoded=True))
+        if status == 200:
+            if len(data.get('entries', [])) > 0:
+                return extract_vessel_info(data), True
+            return None, True
+        logger.debug("Search failed with status %s: %s", status, data)
+        return None, False
     except Exception as e:
-        print(f"Exception when getting vessel by ID {vessel_id}: {e}")
-        return None
+        print(f"Exception when searching vessel by {identifier_type}: {e}")
+        return None, False
 
-def get_vessels_by_ids(vessel_ids, batch_size=10):
+def get_vessels_by_ids(vessel_ids, batch_size=50):
     """Get detailed information for multiple vessels by their IDs in batches."""
     all_vessel_data = []
     
@@ -117,28 +399,34 @@ def get_vessels_by_ids(vessel_ids, batch_size=10):
     for i in range(0, len(vessel_ids), batch_size):
         batch = vessel_ids[i:i+batch_size]
         
-        params = {
-            "datasets[0]": "public-global-vessel-identity:latest"
-        }
-        
-        # Add vessel IDs to params
-        for idx, v_id in enumerate(batch):
-            params[f"ids[{idx}]"] = v_id
+        # Add vessel IDs to the pre-encoded dataset query string
+        ids_qs = "&".join(f"ids%5B{idx}%5D={quote(v_id, safe='')}" for idx, v_id in enumerate(batch))
         
         try:
-            response = requests.get(f"{BASE_URL}/vessels", headers=HEADERS, params=params)
+            response = get_session().get(f"{BASE_URL}/vessels?{_BASE_QS}&{ids_qs}")
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if 'entries' in data:
                     all_vessel_data.extend(data['entries'])
-            else:
-                debug_log(f"Batch lookup failed: {response.status_code}: {response.text}")
+            elif logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Batch lookup failed: %s: %s", response.status_code, response.text)
         except Exception as e:
             print(f"Exception when getting vessels by IDs: {e}")
     
     return all_vessel_data
 
+def _entry_vessel_ids(entry):
+    """Collect every GFW vessel ID an API entry is known under."""
+    ids = set()
+    for info in entry.get('selfReportedInfo') or []:
+        if info.get('id'):
+            ids.add(info['id'])
+    for info in entry.get('combinedSourcesInfo') or []:
+        if info.get('vesselId'):
+            ids.add(info['vesselId'])
+    return ids
+
 def extract_vessel_info(api_response):
     """Extract relevant information from the API response."""
     if not api_response:
@@ -158,210 +446,315 @@ def extract_vessel_info(api_response):
         return {}
     
     try:
-        # Extract from combinedSourcesInfo (more reliable in current API)
-        if 'combinedSourcesInfo' in vessel_data and vessel_data['combinedSourcesInfo']:
-            combined_info = vessel_data['combinedSourcesInfo'][0]
-            
-            # Extract vessel type from geartypes if available
-            if 'geartypes' in combined_info and combined_info['geartypes']:
-                gear_types = []
-                for gear in combined_info['geartypes']:
-                    if 'name' in gear:
-                        gear_types.append(gear['name'])
-                if gear_types:
-                    vessel_info['VesselType'] = ', '.join(gear_types)
-            
-            # NEW: Check for length in combinedSourcesInfo
-            if 'length' in combined_info:
-                vessel_info['Length'] = combined_info.get('length', '')
+        # Look every section up once; each list below is walked a single time
+        combined_info = (vessel_data.get('combinedSourcesInfo') or [{}])[0]
+        registry_info = vessel_data.get('registryInfo') or []
+        registry_list = registry_info if isinstance(registry_info, list) else []
+        self_reported = vessel_data.get('selfReportedInfo') or []
+        authorizations = vessel_data.get('registryPublicAuthorizations') or []
         
-        # Try to get more details from registry info if available
-        if 'registryInfo' in vessel_data and vessel_data['registryInfo']:
-            registry_data = vessel_data['registryInfo']
-            
-            # NEW: Loop through ALL registry records instead of just the first one
-            if isinstance(registry_data, list):
-                for registry in registry_data:
-                    # Update vessel details from registry if not already set
-                    if not vessel_info.get('Length') and 'lengthM' in registry:
-                        vessel_info['Length'] = registry.get('lengthM', '')
-                    if not vessel_info.get('GrossTonnage') and 'tonnageGt' in registry:
-                        vessel_info['GrossTonnage'] = registry.get('tonnageGt', '')
-                    if not vessel_info.get('YearBuilt') and 'yearBuilt' in registry:
-                        vessel_info['YearBuilt'] = registry.get('yearBuilt', '')
-                        
-                    # Extract vessel type if not already set
-                    if not vessel_info.get('VesselType') and 'geartypes' in registry and registry['geartypes']:
-                        if isinstance(registry['geartypes'], list):
-                            vessel_info['VesselType'] = ', '.join(registry['geartypes'])
-            
-            # Also check selfReportedInfo for length (often present there)
-            if 'selfReportedInfo' in vessel_data and vessel_data['selfReportedInfo']:
-                for sri in vessel_data['selfReportedInfo']:
-                    if not vessel_info.get('Length') and 'length' in sri:
-                        vessel_info['Length'] = sri.get('length', '')
+        # Extract from combinedSourcesInfo (more reliable in current API)
+        gear_types = [gear['name'] for gear in combined_info.get('geartypes') or [] if 'name' in gear]
+        if gear_types:
+            vessel_info['VesselType'] = ', '.join(gear_types)
+        if 'length' in combined_info:
+            vessel_info['Length'] = combined_info.get('length', '')
         
-        # Check for authorization data
-        if 'registryPublicAuthorizations' in vessel_data and vessel_data['registryPublicAuthorizations']:
-            auth_data = vessel_data['registryPublicAuthorizations']
-            if auth_data and len(auth_data) > 0:
-                # Use the first authorization
-                auth = auth_data[0]
-                vessel_info['AuthStartDate'] = auth.get('dateFrom', '')
-                vessel_info['AuthEndDate'] = auth.get('dateTo', '')
-                vessel_info['AuthType'] = ', '.join(auth.get('sourceCode', []))
+        # Loop through ALL registry records, filling whatever is still missing
+        for registry in registry_list:
+            if not vessel_info.get('Length') and 'lengthM' in registry:
+                vessel_info['Length'] = registry.get('lengthM', '')
+            if not vessel_info.get('GrossTonnage') and 'tonnageGt' in registry:
+                vessel_info['GrossTonnage'] = registry.get('tonnageGt', '')
+            if not vessel_info.get('YearBuilt') and 'yearBuilt' in registry:
+                vessel_info['YearBuilt'] = registry.get('yearBuilt', '')
+            if not vessel_info.get('VesselType') and isinstance(registry.get('geartypes'), list) and registry['geartypes']:
+                vessel_info['VesselType'] = ', '.join(registry['geartypes'])
         
-        # Add extraction for these additional fields:
+        # Also check selfReportedInfo for length (often present there)
+        if registry_info:
+            for sri in self_reported:
+                if not vessel_info.get('Length') and 'length' in sri:
+                    vessel_info['Length'] = sri.get('length', '')
         
-        # 1. Build details
-        if 'registryInfo' in vessel_data and vessel_data['registryInfo'] and isinstance(vessel_data['registryInfo'], list) and len(vessel_data['registryInfo']) > 0:
-            registry = vessel_data['registryInfo'][0]
+        # Build details from the first registry record
+        if registry_list:
+            registry = registry_list[0]
             if 'buildPlace' in registry:
                 vessel_info['BuildPlace'] = registry.get('buildPlace', '')
             if 'buildCountry' in registry:
                 vessel_info['BuildCountry'] = registry.get('buildCountry', '')
             if 'portName' in registry:
                 vessel_info['HomePort'] = registry.get('portName', '')
-                
-        # 2. Flag history (useful for tracking flag hopping)
-        if 'flagHistory' in vessel_data:
-            flag_history = []
-            for flag_entry in vessel_data['flagHistory']:
-                if 'flag' in flag_entry and 'dateFrom' in flag_entry:
-                    flag_history.append(f"{flag_entry['flag']} ({flag_entry['dateFrom']})")
-            if flag_history:
-                vessel_info['FlagHistory'] = '; '.join(flag_history)
-                
-        # 3. More comprehensive authorization info
-        if 'registryPublicAuthorizations' in vessel_data and vessel_data['registryPublicAuthorizations']:
-            auth_data = vessel_data['registryPublicAuthorizations']
-            if auth_data and len(auth_data) > 0:
-                # Get all authorizations, not just the first one
-                auth_regions = []
-                auth_types = []
-                for auth in auth_data:
-                    if 'region' in auth and auth['region']:
-                        auth_regions.append(auth['region'])
-                    if 'sourceCode' in auth and auth['sourceCode']:
-                        auth_types.extend(auth['sourceCode'])
-                
-                if auth_regions:
-                    vessel_info['AuthRegions'] = ', '.join(set(auth_regions))
-                if auth_types:
-                    vessel_info['AuthTypes'] = ', '.join(set(auth_types))
-                    
-        # 4. Neural model classification for vessel type
-        if 'vesselTypes' in vessel_data:
-            types = []
-            for vessel_type in vessel_data['vesselTypes']:
-                if 'type' in vessel_type and vessel_type['type']:
-                    types.append(vessel_type['type'])
-            if types:
-                vessel_info['NeuralClassification'] = ', '.join(types)
-                
-        # 5. Extract ownership information
-        if 'registryOwners' in vessel_data and vessel_data['registryOwners']:
-            owners = vessel_data['registryOwners']
-            owner_details = []
-            for owner in owners:
-                if 'name' in owner:
-                    owner_name = owner.get('name', '')
-                    owner_country = owner.get('country', '')
-                    owner_details.append(f"{owner_name} ({owner_country})")
-            if owner_details:
-                vessel_info['DetailedOwnership'] = '; '.join(owner_details)
+        
+        # Authorizations: first record for the dates/type, all records for regions/types
+        if authorizations:
+            first_auth = authorizations[0]
+            vessel_info['AuthStartDate'] = first_auth.get('dateFrom', '')
+            vessel_info['AuthEndDate'] = first_auth.get('dateTo', '')
+            vessel_info['AuthType'] = ', '.join(first_auth.get('sourceCode') or [])
+            
+            auth_regions = set()
+            auth_types = set()
+            for auth in authorizations:
+                if auth.get('region'):
+                    auth_regions.add(auth['region'])
+                for source_code in auth.get('sourceCode') or []:
+                    auth_types.add(source_code)
+            if auth_regions:
+                vessel_info['AuthRegions'] = ', '.join(auth_regions)
+            if auth_types:
+                vessel_info['AuthTypes'] = ', '.join(auth_types)
+        
+        # Flag history (useful for tracking flag hopping)
+        flag_history = [
+            f"{flag_entry['flag']} ({flag_entry['dateFrom']})"
+            for flag_entry in vessel_data.get('flagHistory') or []
+            if 'flag' in flag_entry and 'dateFrom' in flag_entry
+        ]
+        if flag_history:
+            vessel_info['FlagHistory'] = '; '.join(flag_history)
+        
+        # Neural model classification for vessel type
+        types = [vessel_type['type'] for vessel_type in vessel_data.get('vesselTypes') or [] if vessel_type.get('type')]
+        if types:
+            vessel_info['NeuralClassification'] = ', '.join(types)
+        
+        # Ownership information
+        owner_details = [
+            f"{owner.get('name', '')} ({owner.get('country', '')})"
+            for owner in vessel_data.get('registryOwners') or []
+            if 'name' in owner
+        ]
+        if owner_details:
+            vessel_info['DetailedOwnership'] = '; '.join(owner_details)
         
     except Exception as e:
         print(f"Error extracting additional vessel info: {e}")
         
     return vessel_info
 
-def process_vessel(row):
-    """Process a single vessel row - for concurrent execution"""
-    vessel_info = {}
+async def process_vessel_async(session, limiter, searches, index, row):
+    """Search for a single vessel record (a plain dict) - one coroutine per vessel
+    
+    The result's 'complete' flag is True only if every lookup tried got a definite answer.
+    """
     vessel_name = row['Vessel Name']
+    complete = True
     
     # Try to find the vessel using different identifiers in priority order
-    response = None
-    
-    # Try with Vessel_ID first (direct ID) - only if it looks valid
-    vessel_id = str(row['Vessel_ID']).strip() if row['Vessel_ID'] else ''
-    if vessel_id and len(vessel_id) > 5:  # Basic check for minimum ID length
-        response = get_vessel_by_id(vessel_id)
+    # (Vessel_ID lookups are already done in bulk by _resolve_by_id_batch)
+    vessel_info = None
     
-    # If not found, try with IMO
-    if not response and row['IMO'] and str(row['IMO']).strip() != '':
-        response = search_vessel_by_identifier('IMO', row['IMO'])
+    # Try with IMO first
+    if vessel_info is None and row['IMO']:
+        vessel_info, definite = await search_vessel_async(session, limiter, searches, 'IMO', row['IMO'])
+        complete = complete and definite
     
     # If still not found, try with SSVID (MMSI)
-    if not response and row['SSVID'] and str(row['SSVID']).strip() != '':
-        response = search_vessel_by_identifier('SSVID', row['SSVID'])
+    if vessel_info is None and row['SSVID']:
+        vessel_info, definite = await search_vessel_async(session, limiter, searches, 'SSVID', row['SSVID'])
+        complete = complete and definite
     
     # If still not found, try with Callsign
-    if not response and row['Callsign'] and str(row['Callsign']).strip() != '':
-        response = search_vessel_by_identifier('Callsign', row['Callsign'])
+    if vessel_info is None and row['Callsign']:
+        vessel_info, definite = await search_vessel_async(session, limiter, searches, 'Callsign', row['Callsign'])
+        complete = complete and definite
         
     # Last resort - try with vessel name
-    if not response and row['Vessel Name'] and str(row['Vessel Name']).strip() != '':
-        response = search_vessel_by_identifier('VesselName', row['Vessel Name'])
-    
-    # Extract information if we found the vessel
-    if response:
-        vessel_info = extract_vessel_info(response)
+    if vessel_info is None and row['Vessel Name']:
+        vessel_info, definite = await search_vessel_async(session, limiter, searches, 'VesselName', row['Vessel Name'])
+        complete = complete and definite
     
     return {
-        'index': row.name,
+        'index': index,
         'vessel_name': vessel_name,
-        'info': vessel_info
+        'info': vessel_info or {},
+        'complete': complete
     }
 
-def enrich_vessel_data(df):
-    """Enrich vessel data with information from the GFW API using concurrent requests."""
-    # Create empty columns for the new information
-    new_columns = [
-        'Length', 'Width', 'GrossTonnage', 'VesselType', 'EngineType', 'EnginePower',
-        'YearBuilt', 'AuthType', 'AuthRegion', 'AuthStartDate', 'AuthEndDate',
-        'Owner', 'Operator',
-        # Add these new columns:
-        'BuildPlace', 'BuildCountry', 'HomePort', 'FlagHistory',
-        'AuthRegions', 'AuthTypes', 'NeuralClassification', 'DetailedOwnership'
-    ]
-    
-    for col in new_columns:
-        df[col] = ''
-    
-    # Process vessels in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # Submit all tasks and collect futures
-        futures = [executor.submit(process_vessel, row) for _, row in df.iterrows()]
+def _redact_request_headers(cached_response):
+    """Strip the API token from a cached response (and its redirects) before it is stored."""
+    cached_response.request_raw_headers = tuple(
+        (name, value) for name, value in cached_response.request_raw_headers
+        if name.lower() != b'authorization'
+    )
+    for redirect in cached_response.history:
+        _redact_request_headers(redirect)
+
+class RedactingSQLiteBackend(SQLiteBackend):
+    """SQLite response cache that never writes the Authorization header to disk.
+    
+    aiohttp_client_cache pickles the request headers with every response, which
+    would leave the GFW token in plain text in the cache file.
+    """
+    
+    async def save_response(self, response, cache_key=None, expires=None):
+        cache_key = cache_key or self.create_key(response.method, response.url)
+        cached_response = await CachedResponse.from_client_response(response, expires)
+        _redact_request_headers(cached_response)
+        await self.responses.write(cache_key, cached_response)
+        
+        # Alias any redirect requests to the same cache key
+        for redirect in response.history:
+            await self.redirects.write(self.create_key(redirect.method, redirect.url), cache_key)
+
+def _open_async_session(connector, timeout, use_cache=True):
+    """Create the aiohttp session for the enrichment run, cached on disk unless disabled."""
+    if not use_cache:
+        return aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout)
+    
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache = RedactingSQLiteBackend(
+        cache_name=os.path.join(CACHE_DIR, "gfw_cache_async.sqlite"),
+        expire_after=CACHE_EXPIRE_SECONDS,
+        allowed_codes=(200,)
+    )
+    return AsyncCachedSession(cache=cache, headers=HEADERS, connector=connector, timeout=timeout)
+
+async def _gather(df, use_cache=True, checkpoint=None):
+    """Run process_vessel_async for every row over one shared aiohttp session."""
+    connector = aiohttp.TCPConnector(
+        limit=MAX_CONNECTIONS,
+        limit_per_host=MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=KEEPALIVE_SECONDS,
+        ttl_dns_cache=DNS_CACHE_SECONDS
+    )
+    timeout = aiohttp.ClientTimeout(total=30)
+    limiter = AdaptiveLimiter()
+    searches = {}  # Shared searches for this run only; tasks are tied to its event loop
+    
+    results = []
+    async with _open_async_session(connector, timeout, use_cache) as session:
+        # Plain dicts are much cheaper to build and read than per-row Series
+        records = df[IDENTIFIER_COLUMNS].to_dict('records')
+        identifiers_by_index = {
+            index: tuple(record[col] for col in IDENTIFIER_COLUMNS)
+            for index, record in zip(df.index, records)
+        }
+        tasks = [
+            process_vessel_async(session, limiter, searches, index, record)
+            for index, record in zip(df.index, records)
+        ]
         
-        # Process results as they complete
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Processing vessels"):
-            result = future.result()
-            if result and result['info']:
-                idx = result['index']
-                vessel_info = result['info']
-                
-                # Update the dataframe with the vessel information
-                for col, value in vessel_info.items():
-                    df.at[idx, col] = value
+        # Collect results as they complete; one failing vessel must not abort the run
+        for task in tqdm_asyncio.as_completed(tasks, total=len(tasks), desc="Processing vessels"):
+            try:
+                result = await task
+            except Exception as e:
+                print(f"Exception when processing vessel: {e}")
+                continue
+            results.append(result)
+            # Vessels hit by temporary failures stay out of the checkpoint so a resume retries them
+            if checkpoint is not None and result['complete']:
+                checkpoint.add(identifiers_by_index[result['index']], result['info'])
+    
+    return results
+
+def _resolve_by_id_batch(df):
+    """Pass 1: look up every row with a Vessel_ID through the batch /vessels endpoint.
+    
+    Returns {row index: vessel info} for every row whose ID came back from the API.
+    """
+    rows_by_id = {}
+    for index, vessel_id in df['Vessel_ID'].items():
+        if vessel_id and _GFW_ID_RE.match(vessel_id):
+            rows_by_id.setdefault(vessel_id, []).append(index)
+    
+    if not rows_by_id:
+        return {}
+    
+    info_by_index = {}
+    for entry in get_vessels_by_ids(list(rows_by_id)):
+        vessel_info = extract_vessel_info({'entries': [entry]})
+        for vessel_id in _entry_vessel_ids(entry):
+            for index in rows_by_id.get(vessel_id, []):
+                info_by_index[index] = vessel_info
+    
+    print(f"Resolved {len(info_by_index)}/{len(df)} vessels by Vessel_ID")
+    return info_by_index
+
+def _resolve_by_search(df_unresolved, use_cache=True, checkpoint=None):
+    """Pass 2: run the identifier search ladder for rows the batch lookup didn't resolve."""
+    if df_unresolved.empty:
+        return {}
+    
+    results = asyncio.run(_gather(df_unresolved, use_cache, checkpoint))
+    return {result['index']: result['info'] for result in results if result}
+
+def enrich_vessel_data(df, use_cache=True, checkpoint_path=None):
+    """Enrich vessel data with information from the GFW API using concurrent requests.
+    
+    With a checkpoint_path (a directory), finished vessels are streamed to Parquet parts
+    as they come in and vessels already in an existing checkpoint are not looked up again.
+    """
+    checkpoint = ResultCheckpoint(checkpoint_path) if checkpoint_path else None
+    identifiers = pd.Series(list(df[IDENTIFIER_COLUMNS].itertuples(index=False, name=None)), index=df.index)
+    try:
+        # Match finished vessels by their identifiers, not by row position
+        done = checkpoint.open() if checkpoint else {}
+        info_by_index = {index: done[key] for index, key in identifiers.items() if key in done}
+        if info_by_index:
+            print(f"Resuming: {len(info_by_index)}/{len(df)} vessels already in {checkpoint_path}")
+        df_todo = df[~df.index.isin(list(info_by_index))]
+        
+        # Resolve known vessel IDs in bulk, then search only for what's left
+        resolved = _resolve_by_id_batch(df_todo)
+        if checkpoint:
+            for index, vessel_info in resolved.items():
+                checkpoint.add(identifiers[index], vessel_info)
+        info_by_index.update(resolved)
+        
+        df_unresolved = df_todo[~df_todo.index.isin(list(resolved))]
+        info_by_index.update(_resolve_by_search(df_unresolved, use_cache, checkpoint))
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    
+    # Assemble all vessel information at once instead of writing cell by cell
+    info_by_index = {index: info for index, info in info_by_index.items() if info}
+    # Built from records with dtype=object so integer API values aren't upcast to float
+    # wherever another row lacks them (from_dict casts only after filling in NaN)
+    new_df = pd.DataFrame(
+        list(info_by_index.values()), index=list(info_by_index), columns=ENRICHED_COLUMNS, dtype=object
+    ).reindex(df.index)
+    df[ENRICHED_COLUMNS] = new_df[ENRICHED_COLUMNS].fillna('').values
     
     return df
 
 def save_enriched_data(df, output_file):
-    """Save the enriched data to a new CSV file."""
+    """Save the enriched data to a new CSV file and a Parquet copy alongside it."""
     df.to_csv(output_file, index=False)
     print(f"Enriched data saved to {output_file}")
     
+    # API values are mixed into '' placeholder columns, so store object columns as strings
+    parquet_file = os.path.splitext(output_file)[0] + '.parquet'
+    object_columns = df.select_dtypes(include='object').columns
+    parquet_df = df.astype({col: 'string' for col in object_columns})
+    for col in CATEGORICAL_COLUMNS:
+        parquet_df[col] = parquet_df[col].astype('category')
+    parquet_df.to_parquet(parquet_file, engine='pyarrow', compression='zstd', index=False)
+    print(f"Enriched data saved to {parquet_file}")
+    
     # Print summary of enriched data
     for col in ['Length', 'Width', 'GrossTonnage', 'VesselType']:
         non_empty = df[df[col] != ''].shape[0]
         print(f"Vessels with {col} data: {non_empty}/{len(df)}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Enrich the vessel list with GFW API data.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk API response cache")
+    parser.add_argument("--debug", action="store_true", help="Log every API request and failed response")
+    args = parser.parse_args()
+    
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+    
     # File paths
     input_file = "./data/results/Merged_Vessel_List_With_Callsigns.csv"
     output_file = "./data/results/Enriched_Vessel_List.csv"
+    checkpoint_dir = "./data/results/Enriched_Vessel_List.checkpoint"
     
     # Read vessel data
     print(f"Reading vessel data from {input_file}")
@@ -382,7 +775,10 @@ def main():
     }
     
     try:
-        response = requests.get(test_url, headers=HEADERS, params=test_params)
+        # Never answer the connectivity check from the cache
+        session = get_session()
+        with session.cache_disabled():
+            response = session.get(test_url, params=test_params)
         if response.status_code != 200:
             print(f"WARNING: API test returned status code {response.status_code}")
     except Exception as e:
@@ -391,10 +787,13 @@ def main():
     
     # Enrich vessel data
     print("Enriching vessel data with GFW API information...")
-    enriched_df = enrich_vessel_data(df)
+    cache_context = session.cache_disabled() if args.no_cache else contextlib.nullcontext()
+    with cache_context:
+        enriched_df = enrich_vessel_data(df, use_cache=not args.no_cache, checkpoint_path=checkpoint_dir)
     
-    # Save enriched data
+    # Save enriched data; the checkpoint is only needed until the run completes
     save_enriched_data(enriched_df, output_file)
+    shutil.rmtree(checkpoint_dir)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,5 @@
+import os
 import pandas as pd
-import re
-
-def extract_length_meters(length_str):
-    if pd.isna(length_str):
-        return 0.0
-    match = re.match(r'^([\d.]+)/[\d.]+$', str(length_str))
-    if match:
-        return float(match.group(1))
-    return 0.0
 
 def main():
     # Read the CSV file
@@ -17,8 +9,14 @@ def main():
     # Load the data
     df = pd.read_csv(input_file)
     
-    # Extract length in meters
-    df['length_m'] = df['Length (m/ft)'].apply(extract_length_meters)
+    # Extract length in meters ("<m>/<ft>"), vectorized over the whole column
+    df['length_m'] = (
+        df['Length (m/ft)']
+        .astype('string')
+        .str.extract(r'^([\d.]+)/[\d.]+$', expand=False)
+        .astype('float64')
+        .fillna(0.0)
+    )
     
     # Filter for fishing vessels longer than 100 meters
     super_trawlers = df[(df['Type'].str.contains('Fishing', na=False)) & (df['length_m'] > 100)]
@@ -29,9 +27,11 @@ def main():
         for _, vessel in super_trawlers.iterrows():
             print(f"IMO: {vessel['IMO']}, Name: {vessel['Full Description'].split(' (IMO')[0]}, Length: {vessel['length_m']}m")
         
-        # Save filtered data to CSV
+        # Save filtered data to CSV, plus a Parquet copy for downstream scripts
         super_trawlers.to_csv(output_file, index=False)
-        print(f"\nSaved super trawler data to {output_file}")
+        parquet_file = os.path.splitext(output_file)[0] + '.parquet'
+        super_trawlers.to_parquet(parquet_file, engine='pyarrow', compression='zstd', index=False)
+        print(f"\nSaved super trawler data to {output_file} and {parquet_file}")
     else:
         print("No super trawlers found in the dataset.")
 